@@ -1,17 +1,87 @@
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
 import subprocess
 import time
 import re
 import os
+import sys
+import copy
+import glob
+import io
+import signal
+import traceback
+import contextlib
 from datetime import datetime
 
+# Prefer the LibYAML-backed loader/dumper when available
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
+# orjson parses the streamed Ollama chunks faster than the stdlib
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# inotify is Linux-only; without it the loop falls back to plain sleeps
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
 # ============================================================
 # CONFIG
 # ============================================================
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 
+# Run generated snippets inside this process instead of a fresh python3.
+# Skips interpreter startup, but the snippet can affect the service itself,
+# so only enable it for trusted models/tasks.
+EXECUTOR_IN_PROCESS = os.getenv("EXECUTOR_IN_PROCESS") == "1"
+
+# Keep a copy of each generated snippet on disk for debugging
+DEBUG_SAVE = os.getenv("DEBUG_SAVE") == "1"
+
+# Max characters of coder output / execution result sent back for review
+FEEDBACK_MAX_CHARS = 2000
+
+# How long Ollama keeps models loaded after a call (-1 = forever).
+# Plain numbers are seconds; Ollama only accepts strings with a unit ("10m").
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit():
+    OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE)
+
+# Reuse one keep-alive connection pool for every Ollama call
+SESSION = requests.Session()
+SESSION.mount(
+    "http://",
+    HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0),
+)
+
+
+# ============================================================
+# YAML LOADING (CACHED BY MTIME)
+# ============================================================
+
+_yaml_cache = {}
+
+
+def load_yaml_cached(path):
+    mtime = os.stat(path).st_mtime
+    hit = _yaml_cache.get(path)
+    if hit and hit[0] == mtime:
+        return hit[1]
+
+    with open(path, "r") as f:
+        data = yaml.load(f, Loader=YamlLoader)
+
+    _yaml_cache[path] = (mtime, data)
+    return data
+
 
 # ============================================================
 # MODEL CALL
@@ -20,27 +90,79 @@ OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 def run_model(model, prompt, system_prompt=""):
     print(f"\n[DEBUG] Calling model: {model}")
 
-    full_prompt = f"{system_prompt}\n\n{prompt}"
-
-    response = requests.post(
+    response = SESSION.post(
         f"{OLLAMA_HOST}/api/generate",
         json={
             "model": model,
-            "prompt": full_prompt,
-            "stream": False,
+            "prompt": prompt,
+            "system": system_prompt,
+            "stream": True,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+        },
+        headers={
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip",
         },
+        stream=True,
     )
 
     response.raise_for_status()
-    return response.json()["response"]
+
+    chunks = []
+
+    with response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+
+            chunk = json_loads(line)
+
+            if "error" in chunk:
+                raise RuntimeError(f"Ollama error: {chunk['error']}")
+
+            chunks.append(chunk.get("response", ""))
+
+            # No break: reading to the end of the body returns the
+            # connection to the pool instead of closing it
+            if chunk.get("done") and chunk.get("done_reason") == "length":
+                print(f"[DEBUG] {model} output truncated (length limit)")
+
+    return "".join(chunks)
+
+
+# ============================================================
+# PREWARM
+# ============================================================
+
+def prewarm(models):
+    # Open the pooled connection and load each model before the first cycle.
+    # An empty prompt makes Ollama load the model without generating.
+    try:
+        SESSION.get(f"{OLLAMA_HOST}/api/tags").raise_for_status()
+
+        for model in dict.fromkeys(models):
+            print(f"[DEBUG] Prewarming model: {model}")
+            SESSION.post(
+                f"{OLLAMA_HOST}/api/generate",
+                json={
+                    "model": model,
+                    "prompt": "",
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                },
+            ).raise_for_status()
+    except requests.RequestException as e:
+        print(f"[DEBUG] Prewarm failed: {e}")
 
 
 # ============================================================
 # CODE EXTRACTION (ROBUST)
 # ============================================================
 
+_CODE_RE = re.compile(r"```(?:python)?\n(.*?)```", re.DOTALL)
+
+
 def extract_code(text):
-    blocks = re.findall(r"```(?:python)?\n(.*?)```", text, re.DOTALL)
+    blocks = _CODE_RE.findall(text)
     if blocks:
         return blocks[-1].strip()
 
@@ -54,20 +176,64 @@ def extract_code(text):
 # EXECUTOR
 # ============================================================
 
-def run_python(code):
-    filename = os.path.join(os.getcwd(), f"generated_{int(time.time())}.py")
+class _ExecTimeout(BaseException):
+    # BaseException so generated code's "except Exception" can't swallow it
+    pass
+
 
-    print("\n[EXECUTOR] Saving generated code...")
+def _raise_exec_timeout(signum, frame):
+    raise _ExecTimeout("Execution timed out after 20 seconds")
 
-    with open(filename, "w") as f:
-        f.write(code)
 
-    print(f"[EXECUTOR] Saved to {filename}")
+def run_python_in_process(code):
+    print("\n[EXECUTOR] Running generated code in-process...")
     print(f"[EXECUTOR] Code length: {len(code)} characters")
 
+    out, err = io.StringIO(), io.StringIO()
+    previous = signal.signal(signal.SIGALRM, _raise_exec_timeout)
+
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                signal.setitimer(signal.ITIMER_REAL, 20)
+                try:
+                    exec(compile(code, "<generated>", "exec"), {"__name__": "__main__"})
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            except SystemExit as e:
+                # Like python3 itself: integer codes are not printed
+                if e.code is not None and not isinstance(e.code, int):
+                    print(e.code, file=sys.stderr)
+            except Exception:
+                traceback.print_exc()
+    except _ExecTimeout as e:
+        return out.getvalue() + err.getvalue() + str(e)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+    return out.getvalue() + err.getvalue()
+
+
+def run_python(code):
+    if EXECUTOR_IN_PROCESS:
+        return run_python_in_process(code)
+
+    print("\n[EXECUTOR] Running generated code...")
+    print(f"[EXECUTOR] Code length: {len(code)} characters")
+
+    if DEBUG_SAVE:
+        filename = os.path.join(os.getcwd(), f"generated_{int(time.time())}.py")
+
+        with open(filename, "w") as f:
+            f.write(code)
+
+        print(f"[EXECUTOR] Saved to {filename}")
+
     try:
         result = subprocess.run(
-            ["python3", filename],
+            ["python3", "-"],
+            input=code,
             capture_output=True,
             text=True,
             timeout=20,
@@ -77,14 +243,65 @@ def run_python(code):
         return str(e)
 
 
+def cleanup_generated():
+    # Remove snippets left behind by earlier runs (or DEBUG_SAVE sessions)
+    for filename in glob.glob(os.path.join(os.getcwd(), "generated_*.py")):
+        try:
+            os.unlink(filename)
+        except OSError as e:
+            print(f"[EXECUTOR] Could not remove {filename}: {e}")
+
+
+# ============================================================
+# STATE WATCH
+# ============================================================
+
+def create_state_watch():
+    if INotify is None:
+        return None
+
+    # Watch the directory: save_state and most editors replace the file,
+    # which would drop a watch on the file itself
+    watch = INotify()
+    watch.add_watch(
+        os.getcwd(),
+        inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO,
+    )
+    return watch
+
+
+def wait_for_state_change(watch, timeout):
+    if watch is None:
+        time.sleep(timeout)
+        return
+
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+
+        events = watch.read(timeout=int(remaining * 1000))
+        if any(event.name == "project_state.yaml" for event in events):
+            return
+
+
 # ============================================================
 # SAVE STATE
 # ============================================================
 
-def save_state(state):
-    time.sleep(1)
-    with open("project_state.yaml", "w") as f:
-        yaml.dump(state, f, sort_keys=False)
+def save_state(state, watch=None):
+    # Write and fsync a temp file, then rename, so neither a crash nor a
+    # power loss leaves a partial file
+    with open("project_state.yaml.tmp", "w") as f:
+        yaml.dump(state, f, Dumper=YamlDumper, sort_keys=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace("project_state.yaml.tmp", "project_state.yaml")
+
+    # Drop the events from our own write so only external edits wake the loop
+    if watch is not None:
+        watch.read(timeout=0)
 
 
 # ============================================================
@@ -93,19 +310,26 @@ def save_state(state):
 
 print("\n--- META AGENT SERVICE STARTED ---\n")
 
+if not DEBUG_SAVE:
+    cleanup_generated()
+
+state_watch = create_state_watch()
+
+prewarm([
+    load_yaml_cached("supervisor.yaml")["model"],
+    load_yaml_cached("coder.yaml")["model"],
+])
+
 while True:
 
     print("\n--- META AGENT CYCLE ---\n")
     print("[DEBUG] Loading YAML files")
 
-    with open("supervisor.yaml", "r") as f:
-        supervisor = yaml.safe_load(f)
-
-    with open("coder.yaml", "r") as f:
-        coder = yaml.safe_load(f)
+    supervisor = load_yaml_cached("supervisor.yaml")
+    coder = load_yaml_cached("coder.yaml")
 
-    with open("project_state.yaml", "r") as f:
-        state = yaml.safe_load(f)
+    # State is mutated in place, so never hand out the cached object
+    state = copy.deepcopy(load_yaml_cached("project_state.yaml"))
 
     supervisor_model = supervisor["model"]
     coder_model = coder["model"]
@@ -124,7 +348,7 @@ while True:
 
     if not current_task:
         print("[META] No pending tasks. Sleeping...")
-        time.sleep(20)
+        wait_for_state_change(state_watch, 20)
         continue
 
     user_goal = current_task["goal"]
@@ -139,7 +363,7 @@ while True:
     if "runner" in user_goal.lower() or "framework" in user_goal.lower():
         print("[SUPERVISOR] Architectural change detected. Skipping task.")
         current_task["status"] = "skipped"
-        save_state(state)
+        save_state(state, state_watch)
         continue
 
     # ========================================================
@@ -160,7 +384,7 @@ while True:
     if "ARCHITECT_REQUIRED" in supervisor_output:
         print("[SUPERVISOR] Architect required. Skipping task.")
         current_task["status"] = "skipped"
-        save_state(state)
+        save_state(state, state_watch)
         continue
 
     # ========================================================
@@ -194,6 +418,18 @@ while True:
         # FEEDBACK LOOP
         # ====================================================
 
+        # Keep the start of the code and the end of the output (where
+        # tracebacks land) so retries don't resend unbounded text
+        coder_snippet = coder_output
+        if len(coder_output) > FEEDBACK_MAX_CHARS:
+            cut = len(coder_output) - FEEDBACK_MAX_CHARS
+            coder_snippet = coder_output[:FEEDBACK_MAX_CHARS] + f"\n...[truncated {cut} chars]"
+
+        exec_snippet = execution_result
+        if len(execution_result) > FEEDBACK_MAX_CHARS:
+            cut = len(execution_result) - FEEDBACK_MAX_CHARS
+            exec_snippet = f"[truncated {cut} chars]...\n" + execution_result[-FEEDBACK_MAX_CHARS:]
+
         feedback_prompt = f"""
 You are the supervisor reviewing execution results.
 
@@ -201,10 +437,10 @@ Original Goal:
 {user_goal}
 
 Coder Output:
-{coder_output}
+{coder_snippet}
 
 Execution Result:
-{execution_result}
+{exec_snippet}
 
 Reply with ONLY ONE LINE.
 
@@ -227,17 +463,17 @@ IMPROVE: <short instruction>
             current_task["last_result"] = execution_result
             current_task["completed_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-            save_state(state)
+            save_state(state, state_watch)
 
             print(f"[META] Task {current_task['id']} marked done.")
 
         else:
             current_task["retries"] = current_task.get("retries", 0) + 1
-            save_state(state)
+            save_state(state, state_watch)
 
     else:
         print("\n[EXECUTOR] No python code detected.")
 
     print("\n--- CYCLE COMPLETE ---\n")
 
-    time.sleep(20)
+    wait_for_state_change(state_watch, 20)